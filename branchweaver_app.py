@@ -3,26 +3,47 @@
 # Author: ChatGPT (for Morgan)
 #
 # Key features
-# - Tabs: Overview • Branch Editor • Visualizer • Playback • Generators • World State • Import/Export • Settings
+# - Sections: Overview • Branch Editor • Visualizer • Playback • Generators • World State • Import/Export • Settings
 # - Node model: id, title, text, tags, npc, location, emotion, gm_notes, choices[{text, target_id, tags, gate}]
 # - Create, edit, duplicate, delete nodes and choices
 # - Graphviz visual map with filters and color/shape by type
 # - Playback mode to rehearse a conversation/path
 # - NPC/Scene snippet generators (rule-based, no external APIs required)
 # - JSON import/export + Markdown export (summary or detailed)
-# - Auto-save to local JSON during the session
+# - Auto-save to a local file (msgpack, or JSON without it) during the session
 
 from __future__ import annotations
+import hashlib
+import itertools
 import json
-import uuid
-from dataclasses import dataclass, field, asdict, is_dataclass
-from typing import Any, Dict, List, Optional, Set
+import re
+from collections import deque
+from functools import partial, wraps
+import secrets
+from dataclasses import dataclass, field, replace
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple, Union
 
 import streamlit as st
-import graphviz
+from streamlit.errors import StreamlitAPIException
 import os
+import queue
+import shutil
+import subprocess
+import sys
+import threading
+import zlib
 from openai import OpenAI
 
+try:
+    import orjson  # optional fast JSON codec; stdlib json is the fallback
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack  # optional binary codec for the autosave file
+except ImportError:
+    msgpack = None
+
 
 # -------------------------------
 # Page & Theme
@@ -44,6 +65,27 @@ class Choice:
     tags: List[str] = field(default_factory=list)
     gate: str = ""  # e.g., "Persuasion DC 13", "Has the map?", "Morale < 3"
 
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "text": self.text,
+            "target_id": self.target_id,
+            "tags": self.tags,
+            "gate": self.gate,
+        }
+
+    @classmethod
+    def _from_dict_fast(cls, d: Dict[str, Any]) -> "Choice":
+        """Build a Choice from parsed JSON without going through ``__init__``."""
+        _get = d.get
+        obj = object.__new__(cls)
+        obj.__dict__ = {
+            "text": _get("text", ""),
+            "target_id": _get("target_id", ""),
+            "tags": [_intern(t) for t in _get("tags") or ()],
+            "gate": _get("gate", ""),
+        }
+        return obj
+
 
 @dataclass
 class Node:
@@ -56,6 +98,59 @@ class Node:
     tags: List[str] = field(default_factory=list)
     gm_notes: str = ""
     choices: List[Choice] = field(default_factory=list)
+    # Runtime-only: bumped on every edit; keys the cached Graphviz labels
+    _rev: int = field(default=0, init=False, repr=False, compare=False)
+    _label_cache: Dict[Tuple[int, bool], str] = field(
+        default_factory=dict, init=False, repr=False, compare=False
+    )
+    # Runtime-only: lowercased title/text for search, refreshed by touch_node
+    _title_lc: str = field(default="", init=False, repr=False, compare=False)
+    _text_lc: str = field(default="", init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        self._title_lc = (self.title or "").lower()
+        self._text_lc = (self.text or "").lower()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "title": self.title,
+            "text": self.text,
+            "npc": self.npc,
+            "location": self.location,
+            "emotion": self.emotion,
+            "tags": self.tags,
+            "gm_notes": self.gm_notes,
+            "choices": [c.to_dict() for c in self.choices],
+        }
+
+    @classmethod
+    def _from_dict_fast(cls, d: Dict[str, Any], nid: str) -> "Node":
+        """Build a Node (and its choices) from parsed JSON without ``__init__``."""
+        _get = d.get
+        choice_from = Choice._from_dict_fast
+        # Legacy files may hold null here; coerce so search fields can't fail
+        title = _get("title") or "(untitled)"
+        text = _get("text") or ""
+        obj = object.__new__(cls)
+        obj.__dict__ = {
+            "id": _get("id", nid),
+            "title": title,
+            "text": text,
+            "npc": _intern(_get("npc", "")),
+            "location": _intern(_get("location", "")),
+            "emotion": _intern(_get("emotion", "")),
+            "tags": [_intern(t) for t in _get("tags") or ()],
+            "gm_notes": _get("gm_notes", ""),
+            "choices": [
+                choice_from(c) for c in _get("choices", []) if isinstance(c, dict)
+            ],
+            "_rev": 0,
+            "_label_cache": {},
+            "_title_lc": title.lower(),
+            "_text_lc": text.lower(),
+        }
+        return obj
 
 
 @dataclass
@@ -64,6 +159,26 @@ class Story:
     description: str = ""
     nodes: Dict[str, Node] = field(default_factory=dict)
     start_node_id: Optional[str] = None
+    # Runtime-only: (uid, revision) identifies one story state across every
+    # session, so it is the key for the shared st.cache_data helpers. A
+    # fresh uid per Story keeps two sessions' revisions from colliding.
+    uid: str = field(default_factory=lambda: secrets.token_hex(8), repr=False, compare=False)
+    revision: int = field(default=0, compare=False)
+    # Reverse adjacency (target id -> source ids), valid for inbound_revision
+    inbound: Dict[str, Set[str]] = field(default_factory=dict, repr=False, compare=False)
+    inbound_revision: int = field(default=-1, repr=False, compare=False)
+    # Runtime-only: ids of the most recently created/edited nodes, newest last
+    recent_ids: Deque[str] = field(
+        default_factory=lambda: deque(maxlen=5), repr=False, compare=False
+    )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "title": self.title,
+            "description": self.description,
+            "start_node_id": self.start_node_id,
+            "nodes": {nid: node.to_dict() for nid, node in self.nodes.items()},
+        }
 
 
 @dataclass
@@ -115,7 +230,31 @@ class StoryState:
 # -------------------------------
 # Helpers & State
 # -------------------------------
+# JSON autosave: the legacy format, still written when msgpack is missing
 AUTOSAVE_PATH = "branchweaver_autosave.json"
+# Binary autosave, written instead of the JSON file when msgpack is installed
+AUTOSAVE_MSGPACK_PATH = "branchweaver_autosave.msgpack"
+# Above this many nodes the branch map renders a neighborhood by default
+# and the "auto" layout switches from dot to a force-directed engine
+LARGE_GRAPH_NODES = 150
+# Layouts available in the bundled viz.js build (it has no sfdp)
+LAYOUT_ENGINES = ["auto", "dot", "fdp", "neato"]
+# Default tone presets offered in Settings
+TONE_PRESETS = ("Cosmic Absurd", "Dread", "Heroic", "Whimsical", "Neutral")
+TONE_INDEX = {v: i for i, v in enumerate(TONE_PRESETS)}
+# Top-level sections; only the selected one is rendered per rerun
+SECTIONS = [
+    "📘 Overview",
+    "🧩 Branch Editor",
+    "🕸️ Visualizer",
+    "▶️ Play Mode",
+    "🎬 Playback",
+    "🧪 Generators",
+    "🧠 AI Assistant",
+    "🌍 World State",
+    "📦 Import / Export",
+    "⚙️ Settings",
+]
 
 if "story" in st.session_state:
     if isinstance(st.session_state.story, str):
@@ -124,7 +263,38 @@ if "story" in st.session_state:
 
 
 def _new_id() -> str:
-    return str(uuid.uuid4())
+    # 64 random bits: ample for per-story uniqueness, and cheaper than uuid4()
+    return secrets.token_hex(8)
+
+
+_TAG_SPLIT = re.compile(r"\s*,\s*")
+
+
+def _intern(value: Any) -> Any:
+    """Intern a short, heavily repeated field value (NPC, location, tag...).
+
+    Thousands of nodes share a few dozen distinct values, so interning keeps
+    one string object per value and lets set/dict lookups match by identity.
+    """
+    return sys.intern(value) if type(value) is str else value
+
+
+def parse_tags(raw: str) -> List[str]:
+    """Split a comma-separated tag field, dropping blanks and outer spaces."""
+    return [_intern(t) for t in _TAG_SPLIT.split(raw.strip()) if t]
+
+
+def mark_changed(story: Story) -> None:
+    """Record that the story was mutated (invalidates revision-keyed caches)."""
+    story.revision += 1
+
+
+def _rerun_fragment() -> None:
+    """Rerun only the calling fragment, or the whole app during a full run."""
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        st.rerun()
 
 
 def ensure_state():
@@ -150,12 +320,11 @@ def ensure_state():
             "playback_node_id": None,
             "playback_history": [],  # list of node_ids visited
             "tone_preset": "Cosmic Absurd",
+            "graph_full": False,  # render every node even on large stories
+            "graph_radius": 2,  # neighborhood hops when not rendering in full
+            "layout_engine": "auto",  # auto | dot | fdp | neato
         }
 
-    # 🔥 Add this NEW block:
-    if "has_imported" not in st.session_state:
-        st.session_state.has_imported = False
-
 
 def _initial_play_state(story: Story) -> StoryState:
     start_id = story.start_node_id or next(iter(story.nodes.keys()), None)
@@ -200,31 +369,188 @@ def canonical_play_context(story: Story) -> Optional[Dict[str, Any]]:
         return None
     return state.to_context(story)
 
+@st.cache_data(max_entries=4, show_spinner=False)
+def _load_autosave_cached(path: str, mtime_ns: int, size: int) -> Story:
+    """Parse an autosave file once per file version (mtime/size are the key).
+
+    cache_data hands every caller its own copy, so sessions that start from
+    the same autosave never share (and mutate) one Story object.
+    """
+    with open(path, "rb") as f:
+        return story_from_autosave_bytes(f.read(), packed=path == AUTOSAVE_MSGPACK_PATH)
+
+
 def try_autoload() -> bool:
-    """Try to restore story from autosave on disk."""
-    if not os.path.exists(AUTOSAVE_PATH):
-        return False
-    try:
-        with open(AUTOSAVE_PATH, "r", encoding="utf-8") as f:
-            data = f.read()
-        st.session_state.story = story_from_json(data)
+    """Try to restore story from autosave on disk.
+
+    The msgpack file is tried first unless the JSON one is newer (written by
+    a run without msgpack); an autosave that exists but can't be read is
+    reported instead of being silently replaced by an empty story.
+    """
+    found = []
+    for path in (AUTOSAVE_MSGPACK_PATH, AUTOSAVE_PATH):
+        try:
+            found.append((os.stat(path), path))
+        except OSError:
+            pass
+    found.sort(key=lambda f: f[0].st_mtime_ns, reverse=True)
+    for info, path in found:
+        if path == AUTOSAVE_MSGPACK_PATH and msgpack is None:
+            # Left in place: JSON autosaves can't overwrite it, and it loads
+            # again once msgpack is installed
+            st.warning(
+                f"Found autosave `{path}`, but the msgpack package isn't installed "
+                "so it can't be read. Install msgpack to restore it."
+            )
+            continue
+        try:
+            story = _load_autosave_cached(path, info.st_mtime_ns, info.st_size)
+        except Exception as e:
+            # Move it aside so the next autosave doesn't overwrite it
+            kept = path + ".unreadable"
+            try:
+                os.replace(path, kept)
+            except OSError:
+                kept = path
+            st.warning(
+                f"Couldn't read autosave `{path}` ({type(e).__name__}); "
+                f"the file was kept as `{kept}`."
+            )
+            continue
+        # Every session gets a copy of the same cached Story; give this one its
+        # own uid so later edits can't share cache keys with another session
+        story.uid = secrets.token_hex(8)
+        st.session_state.story = story
+        # Freshly loaded from disk, so there is nothing new to write back
+        st.session_state._last_saved_key = (story.uid, story.revision)
         return True
-    except Exception:
-        return False
+    return False
+
+
+def _write_autosave(payload: bytes) -> None:
+    """Write autosave bytes via a temp file + os.replace (never a partial file)."""
+    path = AUTOSAVE_MSGPACK_PATH if msgpack is not None else AUTOSAVE_PATH
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(payload)
+    os.replace(tmp_path, path)
+
+
+@st.cache_resource
+def _autosave_writer() -> Tuple["queue.Queue[Tuple[Tuple[str, int], bytes]]", Dict[str, Tuple[int, bool]]]:
+    """Single-slot queue drained by one daemon writer thread per process.
+
+    Returns the queue and an outcome map (story uid -> (revision, written
+    ok)) that the writer fills in, so a session only treats a snapshot as
+    saved once it is actually on disk. Held in cache_resource so reruns reuse
+    the same queue and thread instead of starting a new writer every time.
+    """
+    q: "queue.Queue[Tuple[Tuple[str, int], bytes]]" = queue.Queue(maxsize=1)
+    outcomes: Dict[str, Tuple[int, bool]] = {}
+
+    def _writer() -> None:
+        last_digest = None
+        while True:
+            (uid, revision), payload = q.get()
+            # A new revision can still serialize to the same bytes (e.g. an
+            # edit that was reverted); skip the disk write in that case
+            digest = hashlib.blake2b(payload, digest_size=16).digest()
+            if digest == last_digest:
+                outcomes[uid] = (revision, True)
+                continue
+            try:
+                _write_autosave(payload)
+                last_digest = digest
+                outcomes[uid] = (revision, True)
+            except Exception:
+                # Reported back so autosave() queues the snapshot again
+                outcomes[uid] = (revision, False)
+
+    threading.Thread(target=_writer, name="branchweaver-autosave", daemon=True).start()
+    return q, outcomes
 
 
 def autosave(story: Story) -> None:
-    """Persist story to a local json file (works on Cloud for the life of the session)."""
+    """Persist story to a local file (works on Cloud for the life of the session).
+
+    Only saves when the story (uid, revision) moved since the last confirmed
+    save. The story is serialized here, but the disk write happens on a
+    background thread; a newer snapshot replaces one still waiting, so bursts
+    coalesce. A failed or displaced write is queued again on a later rerun.
+    """
+    key = (story.uid, story.revision)
+    if key == st.session_state.get("_last_saved_key"):
+        return
+    q, outcomes = _autosave_writer()
+    if key == st.session_state.get("_autosave_pending"):
+        outcome = outcomes.get(story.uid)
+        if outcome is None or outcome[0] != story.revision:
+            return  # still queued or being written
+        if outcome[1]:
+            st.session_state._last_saved_key = key
+            return
+        # The write failed (disk full, permissions...): fall through and retry
     try:
-        with open(AUTOSAVE_PATH, "w", encoding="utf-8") as f:
-            f.write(story_to_json(story))
+        payload = story_to_autosave_bytes(story)
     except Exception:
-        # Silent failure is fine; this is just a convenience.
-        pass
+        return
+    while True:
+        try:
+            q.put_nowait((key, payload))
+            break
+        except queue.Full:
+            try:
+                (uid, revision), _ = q.get_nowait()
+                # Let the displaced snapshot's session know to queue it again
+                outcomes[uid] = (revision, False)
+            except queue.Empty:
+                pass
+    st.session_state._autosave_pending = key
+
+
+def story_fragment(fn):
+    """st.fragment for a tab that edits the story.
+
+    A fragment-only rerun never reaches the autosave at the end of main(),
+    so edits made inside it are saved here instead.
+    """
+
+    @wraps(fn)
+    def run(story: Story) -> None:
+        try:
+            fn(story)
+        finally:
+            autosave(story)
+
+    return st.fragment(run)
+
+
+def note_edited(story: Story, node_id: str) -> None:
+    """Record a node as the newest entry in the overview's "Recently Edited"."""
+    recent = story.recent_ids
+    if node_id in recent:
+        recent.remove(node_id)
+    recent.append(node_id)
+
+
+def touch_node(n: Node) -> None:
+    """Invalidate per-node derived data after the node's fields were edited."""
+    n._rev += 1
+    n._label_cache.clear()
+    n._title_lc = (n.title or "").lower()
+    n._text_lc = (n.text or "").lower()
+
+
+# Whitespace that would otherwise break a label line (or leak raw into DOT)
+_LABEL_TRANS = str.maketrans({"\n": " ", "\r": " ", "\t": " "})
 
 
 def node_to_label(n: Node, show_gm: bool = False) -> str:
-    """Label for Graphviz nodes."""
+    """Label for Graphviz nodes (cached per node revision)."""
+    key = (n._rev, show_gm)
+    cached = n._label_cache.get(key)
+    if cached is not None:
+        return cached
     title = n.title or "(untitled)"
     meta = []
     if n.npc:
@@ -235,10 +561,12 @@ def node_to_label(n: Node, show_gm: bool = False) -> str:
         meta.append(f"[{n.emotion}]")
     meta_str = " ".join(meta)
     gm = f"\nGM: {n.gm_notes}" if (show_gm and n.gm_notes) else ""
-    text = (n.text or "").replace("\n", " ")
+    text = n.text or ""
     if len(text) > 160:
         text = text[:157] + "…"
+    text = text.translate(_LABEL_TRANS)
     label = f"{title}\n{text}\n{meta_str}{gm}"
+    n._label_cache[key] = label
     return label
 
 
@@ -252,7 +580,9 @@ COLORS = [
 def color_for_value(value: str) -> str:
     if not value:
         return "#dddddd"
-    idx = abs(hash(value)) % len(COLORS)
+    # crc32 rather than hash(): str hashes are salted per process, which
+    # reshuffled every color after a server restart
+    idx = zlib.crc32(value.encode("utf-8")) % len(COLORS)
     return COLORS[idx]
 
 
@@ -272,132 +602,126 @@ def add_node(
         id=nid,
         title=title.strip() or "(untitled)",
         text=text.strip(),
-        npc=npc.strip(),
-        location=location.strip(),
-        emotion=emotion.strip(),
-        tags=[t.strip() for t in (tags or []) if t.strip()],
+        npc=_intern(npc.strip()),
+        location=_intern(location.strip()),
+        emotion=_intern(emotion.strip()),
+        tags=[_intern(t.strip()) for t in (tags or []) if t.strip()],
         gm_notes=gm_notes.strip(),
         choices=[],
     )
     story.nodes[nid] = node
     if not story.start_node_id:
         story.start_node_id = nid
+    note_edited(story, nid)
+    mark_changed(story)
     return nid
 
 
+def inbound_index(story: Story) -> Dict[str, Set[str]]:
+    """Map each target node id to the ids of nodes with a choice leading there.
+
+    Rebuilt lazily when the story revision has moved past the last build.
+    """
+    if story.inbound_revision != story.revision:
+        inbound: Dict[str, Set[str]] = {}
+        for src_id, n in story.nodes.items():
+            for c in n.choices:
+                if c.target_id:
+                    inbound.setdefault(c.target_id, set()).add(src_id)
+        story.inbound = inbound
+        story.inbound_revision = story.revision
+    return story.inbound
+
+
 def delete_node(story: Story, node_id: str) -> None:
     if node_id in story.nodes:
-        for n in story.nodes.values():
-            n.choices = [c for c in n.choices if c.target_id != node_id]
-        del story.nodes[node_id]
+        inbound = inbound_index(story)
+        # Only nodes that actually link here need their choices filtered
+        for src_id in inbound.pop(node_id, ()):
+            src = story.nodes.get(src_id)
+            if src is not None:
+                src.choices = [c for c in src.choices if c.target_id != node_id]
+        removed = story.nodes.pop(node_id)
+        for c in removed.choices:
+            sources = inbound.get(c.target_id)
+            if sources:
+                sources.discard(node_id)
         if story.start_node_id == node_id:
             story.start_node_id = next(iter(story.nodes.keys()), None)
+        mark_changed(story)
+        # The index was updated in place above, so it is still current
+        story.inbound_revision = story.revision
 
 
 def duplicate_node(story: Story, node_id: str) -> str:
     n = story.nodes[node_id]
     new_id = _new_id()
-    new_node = Node(
+    # replace() carries every init field over (runtime caches start fresh);
+    # only the mutable lists need explicit copies
+    new_node = replace(
+        n,
         id=new_id,
         title=f"{n.title} (copy)",
-        text=n.text,
-        npc=n.npc,
-        location=n.location,
-        emotion=n.emotion,
         tags=list(n.tags),
-        gm_notes=n.gm_notes,
-        choices=[
-            Choice(text=c.text, target_id=c.target_id, tags=list(c.tags), gate=c.gate)
-            for c in n.choices
-        ],
+        choices=[replace(c, tags=list(c.tags)) for c in n.choices],
     )
     story.nodes[new_id] = new_node
+    note_edited(story, new_id)
+    mark_changed(story)
     return new_id
 
 
+@st.cache_data(max_entries=64, show_spinner=False)
+def _world_summaries(uid: str, revision: int, _story: Story) -> Tuple[List[str], List[str], List[str]]:
+    """Sorted NPCs, locations and tags, computed once per story revision."""
+    npcs: Set[str] = set()
+    locs: Set[str] = set()
+    tags: Set[str] = set()
+    for n in _story.nodes.values():
+        if n.npc:
+            npcs.add(n.npc)
+        if n.location:
+            locs.add(n.location)
+        tags.update(n.tags)
+    return sorted(npcs), sorted(locs), sorted(tags)
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def _ids_by_title(uid: str, revision: int, _story: Story) -> List[str]:
+    """Node ids in case-insensitive title order, sorted once per story revision."""
+    nodes = _story.nodes
+    return sorted(nodes, key=lambda nid: nodes[nid]._title_lc)
+
+
 # -------------------------------
 # Serialization
 # -------------------------------
-def story_to_json(story: Story) -> str:
-    """Safe JSON encoder for Story/Node/Choice."""
-
-    def _encode(obj):
-        if is_dataclass(obj):
-            return _encode(asdict(obj))
-        if isinstance(obj, Story):
-            return {
-                "title": obj.title,
-                "description": obj.description,
-                "start_node_id": obj.start_node_id,
-                "nodes": {nid: _encode(node) for nid, node in obj.nodes.items()},
-            }
-        if isinstance(obj, Node):
-            return {
-                "id": obj.id,
-                "title": obj.title,
-                "text": obj.text,
-                "npc": obj.npc,
-                "location": obj.location,
-                "emotion": obj.emotion,
-                "tags": obj.tags,
-                "gm_notes": obj.gm_notes,
-                "choices": [_encode(c) for c in obj.choices],
-            }
-        if isinstance(obj, Choice):
-            return {
-                "text": obj.text,
-                "target_id": obj.target_id,
-                "tags": obj.tags,
-                "gate": obj.gate,
-            }
-        if isinstance(obj, (str, int, float, bool)) or obj is None:
-            return obj
-        if isinstance(obj, list):
-            return [_encode(x) for x in obj]
-        if isinstance(obj, dict):
-            return {k: _encode(v) for k, v in obj.items()}
-        # Fallback: stringify anything weird instead of crashing
-        return str(obj)
-
-    # ensure_ascii=False preserves any non-ASCII characters and the indent
-    # keeps the file human-readable (and proper JSON instead of a quoted blob)
-    return json.dumps(_encode(story), indent=2, ensure_ascii=False)
-
-
-def story_to_json_bytes(story: Story) -> bytes:
-    """Convenience helper to provide UTF-8 encoded JSON for downloads."""
-
-    return story_to_json(story).encode("utf-8")
-
-
-def story_from_json(s: str) -> Story:
-    data = json.loads(s)
-    nodes: Dict[str, Node] = {}
-    for nid, nd in data.get("nodes", {}).items():
-        choices_raw = nd.get("choices", [])
-        choices: List[Choice] = []
-        for c in choices_raw:
-            if not isinstance(c, dict):
-                continue
-            choices.append(
-                Choice(
-                    text=c.get("text", ""),
-                    target_id=c.get("target_id", ""),
-                    tags=c.get("tags", []),
-                    gate=c.get("gate", ""),
-                )
-            )
-        nodes[nid] = Node(
-            id=nd.get("id", nid),
-            title=nd.get("title", "(untitled)"),
-            text=nd.get("text", ""),
-            npc=nd.get("npc", ""),
-            location=nd.get("location", ""),
-            emotion=nd.get("emotion", ""),
-            tags=nd.get("tags", []),
-            gm_notes=nd.get("gm_notes", ""),
-            choices=choices,
-        )
+def story_to_json_bytes(story: Story, pretty: bool = True) -> bytes:
+    """Serialize a Story to UTF-8 JSON via its explicit ``to_dict`` mapping.
+
+    ``pretty`` indents the output for human-facing exports; autosave skips it
+    since indentation is a large share of the encoding cost.
+    """
+    data = story.to_dict()
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2 if pretty else 0)
+    # ensure_ascii=False preserves any non-ASCII characters
+    if pretty:
+        return json.dumps(data, indent=2, ensure_ascii=False).encode("utf-8")
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def story_from_json(s: Union[str, bytes]) -> Story:
+    # Both parsers accept UTF-8 bytes directly, so callers needn't decode first
+    data = orjson.loads(s) if orjson is not None else json.loads(s)
+    return _story_from_dict(data)
+
+
+def _story_from_dict(data: Dict[str, Any]) -> Story:
+    node_from = Node._from_dict_fast
+    nodes: Dict[str, Node] = {
+        nid: node_from(nd, nid) for nid, nd in data.get("nodes", {}).items()
+    }
     return Story(
         title=data.get("title", "Untitled Story"),
         description=data.get("description", ""),
@@ -406,39 +730,110 @@ def story_from_json(s: str) -> Story:
     )
 
 
-def export_markdown(story: Story, detailed: bool = False) -> str:
+def story_to_autosave_bytes(story: Story) -> bytes:
+    """Encode a Story for the internal autosave file.
+
+    msgpack when it's installed (faster and smaller than JSON text), compact
+    JSON otherwise. Import/Export always stays JSON.
+    """
+    if msgpack is not None:
+        return msgpack.packb(story.to_dict(), use_bin_type=True)
+    return story_to_json_bytes(story, pretty=False)
+
+
+def story_from_autosave_bytes(data: bytes, packed: bool) -> Story:
+    """Decode autosave bytes; ``packed`` is True for the msgpack file."""
+    if packed:
+        if msgpack is None:
+            raise RuntimeError("msgpack is not installed")
+        return _story_from_dict(msgpack.unpackb(data, raw=False))
+    return story_from_json(data)
+
+
+def _nodes_start_first(story: Story):
+    """Iterate ``(id, node)`` pairs in story order with the start node first."""
+    nodes = story.nodes
+    start = story.start_node_id
+    if start not in nodes:
+        return iter(nodes.items())
+    return itertools.chain(
+        ((start, nodes[start]),),
+        ((nid, n) for nid, n in nodes.items() if nid != start),
+    )
+
+
+def export_markdown_both(story: Story) -> Tuple[str, str]:
+    """Build the summary and detailed Markdown exports in one pass.
+
+    The detailed document only adds GM-note blocks, so both are joined from
+    one line list; the summary just skips the recorded GM-note slices.
+    """
     lines = [f"# {story.title}", ""]
+    append = lines.append
+    extend = lines.extend
+    gm_at: List[int] = []
     if story.description:
-        lines.append(story.description)
-        lines.append("")
-
-    order = list(story.nodes.keys())
-    if story.start_node_id in order:
-        order.remove(story.start_node_id)
-        order.insert(0, story.start_node_id)
-
-    for nid in order:
-        n = story.nodes[nid]
-        lines.append(f"## {n.title} ({nid[:8]})")
-        if n.npc or n.location or n.emotion:
-            meta = [x for x in [n.npc, n.location, n.emotion] if x]
-            lines.append("*" + " • ".join(meta) + "*")
-        if n.tags:
-            lines.append("Tags: " + ", ".join(n.tags))
-        lines.append("")
-        lines.append(n.text)
-        if detailed and n.gm_notes:
-            lines.append("")
-            lines.append(f"> **GM Notes:** {n.gm_notes}")
-        if n.choices:
-            lines.append("")
-            lines.append("**Choices**")
-            for c in n.choices:
+        append(story.description)
+        append("")
+
+    for nid, n in _nodes_start_first(story):
+        append(f"## {n.title} ({nid[:8]})")
+        meta = [x for x in (n.npc, n.location, n.emotion) if x]
+        if meta:
+            append("*" + " • ".join(meta) + "*")
+        tags = n.tags
+        if tags:
+            append("Tags: " + ", ".join(tags))
+        extend(("", n.text))
+        gm_notes = n.gm_notes
+        if gm_notes:
+            gm_at.append(len(lines))
+            extend(("", f"> **GM Notes:** {gm_notes}"))
+        choices = n.choices
+        if choices:
+            extend(("", "**Choices**"))
+            for c in choices:
                 gate = f" [{c.gate}]" if c.gate else ""
                 tag = f" (tags: {', '.join(c.tags)})" if c.tags else ""
-                lines.append(f"- {c.text}{gate} → `{c.target_id[:8]}`{tag}")
-        lines.append("")
-    return "\n".join(lines)
+                append(f"- {c.text}{gate} → `{c.target_id[:8]}`{tag}")
+        append("")
+
+    detailed = "\n".join(lines)
+    if not gm_at:
+        return detailed, detailed
+    summary_lines: List[str] = []
+    prev = 0
+    for i in gm_at:
+        summary_lines.extend(lines[prev:i])
+        prev = i + 2
+    summary_lines.extend(lines[prev:])
+    return "\n".join(summary_lines), detailed
+
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def _export_json_cached(uid: str, revision: int, _story: Story) -> bytes:
+    """Pretty JSON export, built once per story revision."""
+    return story_to_json_bytes(_story)
+
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def _export_markdown_pair(uid: str, revision: int, _story: Story) -> Tuple[bytes, bytes]:
+    """Summary and detailed Markdown as UTF-8, built once per story revision."""
+    summary, detailed = export_markdown_both(_story)
+    return summary.encode("utf-8"), detailed.encode("utf-8")
+
+
+def _export_markdown_cached(uid: str, revision: int, _story: Story, detailed: bool) -> bytes:
+    """One of the two Markdown exports, from the shared per-revision cache.
+
+    Runs when a download button is clicked, with the uid/revision that button
+    was rendered for. If the story has moved on since, export it as it is now
+    without caching, so newer content never lands under the old cache key.
+    """
+    idx = 1 if detailed else 0
+    if (_story.uid, _story.revision) != (uid, revision):
+        return export_markdown_both(_story)[idx].encode("utf-8")
+    return _export_markdown_pair(uid, revision, _story)[idx]
 
 # -------------------------------
 # OpenAI helpers (AI integration)
@@ -472,10 +867,8 @@ def build_story_context(story: Story, max_nodes: int = 40) -> str:
     if story.description:
         lines.append(f"Story description: {story.description}")
 
-    # Collect NPCs, locations, tags
-    npcs = sorted({n.npc for n in story.nodes.values() if n.npc})
-    locs = sorted({n.location for n in story.nodes.values() if n.location})
-    tags = sorted({t for n in story.nodes.values() for t in n.tags})
+    # Collect NPCs, locations, tags (shared with World State, per revision)
+    npcs, locs, tags = _world_summaries(story.uid, story.revision, story)
 
     if npcs:
         lines.append("NPCs: " + ", ".join(npcs))
@@ -487,16 +880,13 @@ def build_story_context(story: Story, max_nodes: int = 40) -> str:
     # Summarize up to max_nodes
     lines.append("")
     lines.append(f"=== Node summaries (up to {max_nodes}) ===")
-    node_items = list(story.nodes.items())
-
-    # Try to put start node first
-    if story.start_node_id and story.start_node_id in story.nodes:
-        node_items.sort(key=lambda kv: kv[0] != story.start_node_id)
-
-    for i, (nid, n) in enumerate(node_items[:max_nodes]):
-        snippet = (n.text or "").replace("\n", " ")
+    # Start node first; islice stops once max_nodes have been summarized
+    node_items = itertools.islice(_nodes_start_first(story), max_nodes)
+    for i, (nid, n) in enumerate(node_items):
+        snippet = n.text or ""
         if len(snippet) > 160:
             snippet = snippet[:157] + "…"
+        snippet = snippet.translate(_LABEL_TRANS)
         lines.append(
             f"- Node {i+1}: id={nid[:8]}, title='{n.title}', "
             f"npc='{n.npc}', location='{n.location}', emotion='{n.emotion}', "
@@ -580,7 +970,7 @@ def apply_ai_nodes_to_story(story: Story, ai_json: str, attach_parent_id: Option
         for ch_def in nd.get("choices", []) or []:
             c_text = ch_def.get("text", "")
             gate = ch_def.get("gate", "")
-            c_tags = ch_def.get("tags", []) or []
+            c_tags = [_intern(t) for t in ch_def.get("tags") or ()]
             tgt_title = (ch_def.get("target_title") or "").strip()
             target_id = title_to_id.get(tgt_title, "")
             node.choices.append(
@@ -607,6 +997,7 @@ def apply_ai_nodes_to_story(story: Story, ai_json: str, attach_parent_id: Option
                 )
             )
 
+    mark_changed(story)
     return new_ids
 
 
@@ -675,8 +1066,10 @@ def load_seed(story: Story, seed=SEED_STORY) -> None:
     title = seed.get("title", "Seed Story")
     description = seed.get("description", "")
     id_map: Dict[str, str] = {}
+    # Choices point at titles, which may belong to nodes not created yet;
+    # keep them with their source node id and resolve after the one pass
+    pending: List[Tuple[str, list]] = []
 
-    # Create nodes first
     for entry in seed.get("nodes", []):
         nid = add_node(
             story,
@@ -689,29 +1082,29 @@ def load_seed(story: Story, seed=SEED_STORY) -> None:
             gm_notes=entry.get("gm_notes", ""),
         )
         id_map[entry.get("title", nid)] = nid
+        if entry.get("choices"):
+            pending.append((nid, entry["choices"]))
 
     # Wire choices
-    for entry in seed.get("nodes", []):
-        src_title = entry.get("title", "")
-        src_id = id_map.get(src_title)
-        if not src_id:
-            continue
-        for ch in entry.get("choices", []):
-            tgt_title = ch.get("target", "")
-            tgt_id = id_map.get(tgt_title)
+    nodes = story.nodes
+    for src_id, choices in pending:
+        src_choices = nodes[src_id].choices
+        for ch in choices:
+            tgt_id = id_map.get(ch.get("target", ""))
             if not tgt_id:
                 continue
-            story.nodes[src_id].choices.append(
+            src_choices.append(
                 Choice(
                     text=ch.get("text", ""),
                     target_id=tgt_id,
-                    tags=list(ch.get("tags", [])),
+                    tags=[_intern(t) for t in ch.get("tags", [])],
                     gate=ch.get("gate", ""),
                 )
             )
 
     story.title = title
     story.description = description
+    mark_changed(story)
 
 
 # -------------------------------
@@ -719,8 +1112,12 @@ def load_seed(story: Story, seed=SEED_STORY) -> None:
 # -------------------------------
 def sidebar_project(story: Story):
     st.sidebar.subheader("🗂️ Project")
-    story.title = st.sidebar.text_input("Story Title", story.title)
-    story.description = st.sidebar.text_area("Description", story.description, height=80)
+    title = st.sidebar.text_input("Story Title", story.title)
+    description = st.sidebar.text_area("Description", story.description, height=80)
+    if (title, description) != (story.title, story.description):
+        story.title = title
+        story.description = description
+        mark_changed(story)
 
     if st.sidebar.button("🌱 Load Seed (Grol)"):
         st.session_state.story = Story()
@@ -753,6 +1150,25 @@ def sidebar_project(story: Story):
         ["type", "none"],
         index=["type", "none"].index(st.session_state.ui["shape_by"]),
     )
+    st.session_state.ui["layout_engine"] = st.sidebar.selectbox(
+        "Layout engine",
+        LAYOUT_ENGINES,
+        index=LAYOUT_ENGINES.index(st.session_state.ui.get("layout_engine", "auto")),
+        help="'auto' uses the ranked dot layout for small maps and the force-directed fdp layout for large ones.",
+    )
+    if len(story.nodes) > LARGE_GRAPH_NODES:
+        st.session_state.ui["graph_full"] = st.sidebar.checkbox(
+            "Show full graph (slow on large stories)",
+            st.session_state.ui.get("graph_full", False),
+        )
+        st.session_state.ui["graph_radius"] = st.sidebar.slider(
+            "Render radius",
+            min_value=1,
+            max_value=6,
+            value=st.session_state.ui.get("graph_radius", 2),
+            disabled=st.session_state.ui["graph_full"],
+            help="Hops around the selected (or start) node to draw on the map.",
+        )
 
 
 # ------------- Tab: Overview -------------
@@ -770,9 +1186,13 @@ def tab_overview(story: Story):
 
     with c2:
         st.markdown("### 🧾 Recently Edited")
-        recent = list(story.nodes.values())[-5:]
+        recent_ids = [nid for nid in story.recent_ids if nid in story.nodes]
+        if not recent_ids:
+            # Nothing touched this session yet: show the newest nodes
+            recent_ids = list(itertools.islice(reversed(story.nodes), 5))[::-1]
+        recent = [story.nodes[nid] for nid in recent_ids]
         if not recent:
-            st.info("No nodes yet. Add one in the Branch Editor tab.")
+            st.info("No nodes yet. Add one in the Branch Editor section.")
         for n in reversed(recent):
             with st.expander(f"{n.title}  ·  {n.id[:8]}"):
                 st.write(n.text)
@@ -793,7 +1213,10 @@ def tab_overview(story: Story):
 
 
 # ------------- Tab: Branch Editor -------------
+@story_fragment
 def tab_editor(story: Story):
+    # Snapshot iteration order once per run; reused by every list below
+    items = tuple(story.nodes.items())
     left, right = st.columns([2, 3])
 
     # -------- LEFT: Node list & actions --------
@@ -808,7 +1231,7 @@ def tab_editor(story: Story):
         )
         st.session_state.ui["editor_search"] = search_val
 
-        available_tags = sorted({t for n in story.nodes.values() for t in n.tags})
+        all_npcs, all_locs, available_tags = _world_summaries(story.uid, story.revision, story)
         preserved_tags = [
             t for t in st.session_state.ui.get("tag_filter", []) if t in available_tags
         ]
@@ -820,7 +1243,7 @@ def tab_editor(story: Story):
         )
         st.session_state.ui["tag_filter"] = tag_filter
 
-        npc_options = ["(Any)"] + sorted({n.npc for n in story.nodes.values() if n.npc})
+        npc_options = ["(Any)"] + all_npcs
         npc_sel = st.selectbox(
             "NPC",
             npc_options,
@@ -830,9 +1253,7 @@ def tab_editor(story: Story):
         )
         st.session_state.ui["filter_npc"] = npc_sel
 
-        loc_options = ["(Any)"] + sorted(
-            {n.location for n in story.nodes.values() if n.location}
-        )
+        loc_options = ["(Any)"] + all_locs
         loc_sel = st.selectbox(
             "Location",
             loc_options,
@@ -851,12 +1272,15 @@ def tab_editor(story: Story):
         q = search_val.lower().strip()
         tag_filter_set = set(tag_filter)
 
+        # Walk nodes in the cached title order so the result needs no sort
         filtered_items = []
-        for nid, node in story.nodes.items():
+        nodes = story.nodes
+        for nid in _ids_by_title(story.uid, story.revision, story):
+            node = nodes[nid]
             matches = True
             if q and not (
-                q in node.title.lower()
-                or q in (node.text or "").lower()
+                q in node._title_lc
+                or q in node._text_lc
                 or q in (node.npc or "").lower()
                 or q in (node.gm_notes or "").lower()
             ):
@@ -878,8 +1302,6 @@ def tab_editor(story: Story):
             if matches:
                 filtered_items.append((nid, node, broken))
 
-        filtered_items.sort(key=lambda kv: kv[1].title.lower())
-
         selected_id = st.session_state.ui.get("selected_node_id")
 
         if not filtered_items:
@@ -889,19 +1311,23 @@ def tab_editor(story: Story):
                 st.session_state.ui["selected_node_id"] = nid
                 st.rerun()
         else:
-            options = [
-                f"{'⚠️ ' if broken else ''}{v.title}  ·  {k[:8]}"
+            options = {
+                k: f"{'⚠️ ' if broken else ''}{v.title}  ·  {k[:8]}"
                 for k, v, broken in filtered_items
-            ]
-            ids = [k for k, _, _ in filtered_items]
+            }
+            ids = list(options)
 
-            if selected_id not in ids:
+            if selected_id not in options:
                 selected_id = ids[0]
                 st.session_state.ui["selected_node_id"] = selected_id
 
-            idx = ids.index(selected_id)
-            sel = st.selectbox("Select a node", options, index=idx)
-            selected_id = ids[options.index(sel)]
+            # Options are ids, so the selection needs no label -> id reverse scan
+            selected_id = st.selectbox(
+                "Select a node",
+                ids,
+                index=ids.index(selected_id),
+                format_func=lambda nid: options[nid],
+            )
             st.session_state.ui["selected_node_id"] = selected_id
 
             sel_node = story.nodes.get(selected_id)
@@ -937,6 +1363,7 @@ def tab_editor(story: Story):
         with c3:
             if selected_id and st.button("⭐ Make Start", use_container_width=True):
                 story.start_node_id = selected_id
+                mark_changed(story)
         with c4:
             if selected_id and st.button("🗑️ Delete", use_container_width=True):
                 delete_node(story, selected_id)
@@ -1011,59 +1438,64 @@ def tab_editor(story: Story):
             node.title = title_val.strip() or "(untitled)"
             node.text = text_val.strip()
             node.gm_notes = gm_val.strip()
-            node.npc = npc_val.strip()
-            node.location = loc_val.strip()
-            node.emotion = emo_val.strip()
-            node.tags = [t.strip() for t in tag_str.split(",") if t.strip()]
+            node.npc = _intern(npc_val.strip())
+            node.location = _intern(loc_val.strip())
+            node.emotion = _intern(emo_val.strip())
+            node.tags = parse_tags(tag_str)
+            touch_node(node)
+            note_edited(story, node.id)
+            mark_changed(story)
             st.success("Node details saved.")
 
         st.markdown("---")
         st.markdown("#### Choices / Branches")
 
-        # Prepare list of nodes for target selection
-        node_ids = list(story.nodes.keys())
-        node_labels = [
-            f"{story.nodes[nid].title} · {nid[:8]}" for nid in node_ids
-        ]
-        target_choices = [
-            ("", "🚧 Unlinked — decide later")
-        ] + list(zip(node_ids, node_labels))
+        # Prepare target options once; selectboxes return ids directly and
+        # labels / current positions are dict lookups
+        target_ids = [""] + [nid for nid, _ in items]
+        id_to_pos = {nid: pos for pos, nid in enumerate(target_ids)}
+        target_labels = {"": "🚧 Unlinked — decide later"}
+        target_labels.update((nid, f"{n.title} · {nid[:8]}") for nid, n in items)
 
         # --- Existing choices ---
-        for i, ch in enumerate(list(node.choices)):
+        # Remove/move clicks are recorded here and applied after the loop, so
+        # the list isn't reshuffled mid-render and only one rerun is issued
+        pending: Optional[Tuple[str, int]] = None
+        for i, ch in enumerate(node.choices):
             with st.expander(f"Choice {i+1}: {ch.text or '(untitled)'}"):
-                ch.text = st.text_input(
-                    "Choice text", value=ch.text, key=f"ct_{selected_id}_{i}"
-                )
-                ch.gate = st.text_input(
-                    "Gate/Requirement (optional)",
-                    value=ch.gate,
-                    key=f"gate_{selected_id}_{i}",
-                )
-                ch.tags = [
-                    t.strip()
-                    for t in st.text_input(
+                # A form per choice: typing doesn't rerun the editor, and the
+                # tag string is only parsed when the choice is saved
+                with st.form(key=f"choice_{selected_id}_{i}_form"):
+                    text_val = st.text_input(
+                        "Choice text", value=ch.text, key=f"ct_{selected_id}_{i}"
+                    )
+                    gate_val = st.text_input(
+                        "Gate/Requirement (optional)",
+                        value=ch.gate,
+                        key=f"gate_{selected_id}_{i}",
+                    )
+                    tags_val = st.text_input(
                         "Tags (comma-separated)",
                         value=", ".join(ch.tags),
                         key=f"ctags_{selected_id}_{i}",
-                    ).split(",")
-                    if t.strip()
-                ]
+                    )
 
-                # Target selector with placeholder
-                target_idx = 0
-                for idx, (nid, _) in enumerate(target_choices):
-                    if nid == ch.target_id:
-                        target_idx = idx
-                        break
-                sel_target = st.selectbox(
-                    "Leads to node",
-                    target_choices,
-                    index=target_idx,
-                    format_func=lambda item: item[1],
-                    key=f"sel_{selected_id}_{i}",
-                )
-                ch.target_id = sel_target[0]
+                    # Target selector with placeholder
+                    target_val = st.selectbox(
+                        "Leads to node",
+                        target_ids,
+                        index=id_to_pos.get(ch.target_id, 0),
+                        format_func=lambda nid: target_labels[nid],
+                        key=f"sel_{selected_id}_{i}",
+                    )
+                    save_choice = st.form_submit_button(
+                        "💾 Save Choice", key=f"savech_{selected_id}_{i}"
+                    )
+                if save_choice:
+                    edited = (text_val, gate_val, parse_tags(tags_val), target_val)
+                    if edited != (ch.text, ch.gate, ch.tags, ch.target_id):
+                        ch.text, ch.gate, ch.tags, ch.target_id = edited
+                        mark_changed(story)
 
                 if not ch.target_id:
                     st.info("This choice is saved but not wired to a target yet.")
@@ -1079,80 +1511,144 @@ def tab_editor(story: Story):
 
                 col_rm, col_up, col_dn = st.columns(3)
                 if col_rm.button("Remove", key=f"rm_{selected_id}_{i}"):
-                    node.choices.pop(i)
-                    st.rerun()
+                    pending = ("remove", i)
                 if col_up.button("↑ Move", key=f"up_{selected_id}_{i}") and i > 0:
-                    node.choices[i - 1], node.choices[i] = (
-                        node.choices[i],
-                        node.choices[i - 1],
-                    )
-                    st.rerun()
+                    pending = ("swap", i - 1)
                 if (
                     col_dn.button("↓ Move", key=f"dn_{selected_id}_{i}")
                     and i < len(node.choices) - 1
                 ):
-                    node.choices[i + 1], node.choices[i] = (
-                        node.choices[i],
-                        node.choices[i + 1],
-                    )
-                    st.rerun()
+                    pending = ("swap", i)
+
+        if pending is not None:
+            action, i = pending
+            # Choice widgets are keyed by position, so drop their state from
+            # the first affected slot on; otherwise the old values would be
+            # written back over the reordered choices on the next run
+            for j in range(i, len(node.choices)):
+                for prefix in ("ct", "gate", "ctags", "sel"):
+                    st.session_state.pop(f"{prefix}_{selected_id}_{j}", None)
+            if action == "remove":
+                node.choices.pop(i)
+            else:
+                node.choices[i], node.choices[i + 1] = (
+                    node.choices[i + 1],
+                    node.choices[i],
+                )
+            mark_changed(story)
+            # Choice edits only affect this tab; skip the full-app rerun
+            _rerun_fragment()
 
         # --- Add new choice ---
         st.markdown("**Add Choice**")
         new_c_text = st.text_input("New choice text", key=f"newct_{selected_id}")
-        if node_ids:
-            default_idx = next(
-                (idx for idx, (nid, _) in enumerate(target_choices) if nid == selected_id),
-                0,
-            )
-        else:
-            default_idx = 0
-        tar_sel = st.selectbox(
+        target_id = st.selectbox(
             "Target node",
-            target_choices if target_choices else [("", "(no nodes)")],
-            index=min(default_idx, len(target_choices) - 1) if target_choices else 0,
-            format_func=lambda item: item[1],
+            target_ids,
+            index=id_to_pos.get(selected_id, 0),
+            format_func=lambda nid: target_labels[nid],
             key=f"newtar_{selected_id}",
         )
         req = st.text_input("Gate (opt.)", key=f"newgate_{selected_id}")
 
         if st.button("➕ Add Choice", key=f"addchoice_{selected_id}") and new_c_text:
-            target_id = tar_sel[0]
             node.choices.append(
                 Choice(text=new_c_text, target_id=target_id, gate=req)
             )
-            st.rerun()
+            mark_changed(story)
+            _rerun_fragment()
 
 
 # ------------- Tab: Visualizer -------------
 
-def tab_visualizer(story: Story):
-    st.subheader("🕸️ Branch Map")
+_DOT_ESCAPES = str.maketrans({"\\": "\\\\", '"': '\\"', "\n": "\\n"})
 
-    q = st.session_state.ui["filter_text"].lower().strip()
-    show_gm = st.session_state.ui["show_gm"]
-    color_by = st.session_state.ui["color_by"]
-    shape_by = st.session_state.ui["shape_by"]
 
-    legend_entries = {}
+def _dot_quote(value: str) -> str:
+    """Quote a string as a DOT ID (backslashes, quotes and newlines escaped)."""
+    return '"' + value.translate(_DOT_ESCAPES) + '"'
 
-    # Build DOT graph (no call to dot.pipe / no system graphviz needed)
-    dot = graphviz.Digraph("branchweaver")
-    dot.attr(rankdir="LR")
 
-    # Nodes
-    for nid, n in story.nodes.items():
-        if q and (q not in n.title.lower() and q not in n.text.lower()):
-            continue
+def _graph_signature(story: Story, show_gm: bool) -> tuple:
+    """Immutable snapshot of everything the branch map depends on."""
+    return tuple(
+        (
+            nid,
+            n._title_lc,
+            n._text_lc,
+            n.npc,
+            n.location,
+            n.emotion,
+            node_to_label(n, show_gm),
+            tuple((c.text, c.target_id, c.gate) for c in n.choices),
+        )
+        for nid, n in story.nodes.items()
+    )
+
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def _build_dot_source(
+    uid: str,
+    revision: int,
+    show_gm: bool,
+    _story: Story,
+    start_id: Optional[str],
+    q: str,
+    color_by: str,
+    shape_by: str,
+    focus_id: Optional[str] = None,
+    radius: int = 0,
+) -> tuple:
+    """Build the DOT source and color legend for the branch map.
+
+    Cached on the story uid/revision plus display settings so reruns that don't
+    touch the graph skip the rebuild entirely, without hashing the whole
+    story for the cache key. With ``focus_id`` set, only nodes within
+    ``radius`` choice-hops of it (in either direction) are drawn.
+    """
+    nodes_sig = _graph_signature(_story, show_gm)
+    legend_entries: Dict[str, str] = {}
+
+    near: Optional[Set[str]] = None
+    if focus_id is not None:
+        neighbors: Dict[str, Set[str]] = {entry[0]: set() for entry in nodes_sig}
+        for nid, *_, choices in nodes_sig:
+            for _, target_id, _ in choices:
+                if target_id in neighbors:
+                    neighbors[nid].add(target_id)
+                    neighbors[target_id].add(nid)
+        near = {focus_id}
+        frontier = {focus_id}
+        for _ in range(radius):
+            frontier = {t for nid in frontier for t in neighbors.get(nid, ())} - near
+            if not frontier:
+                break
+            near |= frontier
+
+    # Apply the filters once; nodes and edges both reuse the result
+    visible = [
+        entry
+        for entry in nodes_sig
+        if (near is None or entry[0] in near)
+        and (not q or q in entry[1] or q in entry[2])
+    ]
+    visible_ids = {entry[0] for entry in visible}
 
+    # Emit DOT text directly into one list and join once at the end
+    # (laid out by system Graphviz when installed, otherwise by viz.js)
+    parts = ["digraph branchweaver {\n", "\trankdir=LR\n"]
+    append = parts.append
+
+    # Nodes
+    for nid, _, _, npc, location, emotion, label, _ in visible:
         # color
         color_val = None
         if color_by == "npc":
-            color_val = n.npc
+            color_val = npc
         elif color_by == "location":
-            color_val = n.location
+            color_val = location
         elif color_by == "emotion":
-            color_val = n.emotion
+            color_val = emotion
         fill = color_for_value(color_val) if color_by != "none" else "#ffffff"
         style = "filled" if color_by != "none" else "solid"
 
@@ -1164,24 +1660,107 @@ def tab_visualizer(story: Story):
         # shape
         shape = "oval"
         if shape_by == "type":
-            shape = "doublecircle" if story.start_node_id == nid else "box"
+            shape = "doublecircle" if start_id == nid else "box"
 
-        label = node_to_label(n, show_gm)
-        dot.node(nid, label=label, shape=shape, style=style, fillcolor=fill)
+        append(
+            f"\t{_dot_quote(nid)} [label={_dot_quote(label)} fillcolor={_dot_quote(fill)} "
+            f"shape={shape} style={style}]\n"
+        )
 
-    # Edges
-    for nid, n in story.nodes.items():
-        if q and (q not in n.title.lower() and q not in n.text.lower()):
-            continue
-        for ch in n.choices:
-            if ch.target_id not in story.nodes:
+    # Edges (only between visible nodes, so filtered-out targets don't
+    # reappear as bare id boxes)
+    for nid, _, _, _, _, _, _, choices in visible:
+        for ch_text, target_id, gate in choices:
+            if target_id not in visible_ids:
                 continue
-            gate = f" [{ch.gate}]" if ch.gate else ""
-            edge_label = (ch.text or "") + gate
-            dot.edge(nid, ch.target_id, label=edge_label)
+            gate = f" [{gate}]" if gate else ""
+            edge_label = (ch_text or "") + gate
+            append(
+                f"\t{_dot_quote(nid)} -> {_dot_quote(target_id)} "
+                f"[label={_dot_quote(edge_label)}]\n"
+            )
+    append("}\n")
+
+    return "".join(parts), legend_entries, len(visible)
 
-    dot_source = dot.source
-    dot_js = json.dumps(dot_source)  # safe escape as JS string
+
+# Keyed on the DOT text, so hits are always current; the TTL only exists so a
+# cached "not installed" (None) result is retried after Graphviz is added
+@st.cache_data(max_entries=16, ttl="10m", show_spinner=False)
+def _render_svg_native(dot_source: str, engine: str) -> Optional[str]:
+    """Lay out the map with a local Graphviz binary, if one is installed.
+
+    Returns the ``<svg>`` element markup, or None so the caller falls back to
+    rendering with viz.js in the browser.
+    """
+    exe = shutil.which(engine)
+    if exe is None:
+        return None
+    try:
+        result = subprocess.run(
+            [exe, "-Tsvg"],
+            input=dot_source.encode("utf-8"),
+            capture_output=True,
+            timeout=30,
+            check=True,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    svg = result.stdout.decode("utf-8", errors="replace")
+    # Drop the XML prolog/doctype so the markup can sit inside a <div>
+    start = svg.find("<svg")
+    return svg[start:] if start >= 0 else None
+
+
+@st.fragment
+def tab_visualizer(story: Story):
+    st.subheader("🕸️ Branch Map")
+
+    q = st.session_state.ui["filter_text"].lower().strip()
+    show_gm = st.session_state.ui["show_gm"]
+    color_by = st.session_state.ui["color_by"]
+    shape_by = st.session_state.ui["shape_by"]
+
+    # Large stories render a neighborhood unless the full graph is requested
+    focus_id = None
+    radius = st.session_state.ui.get("graph_radius", 2)
+    if len(story.nodes) > LARGE_GRAPH_NODES and not st.session_state.ui.get("graph_full"):
+        focus_id = st.session_state.ui.get("selected_node_id")
+        if focus_id not in story.nodes:
+            focus_id = story.start_node_id or next(iter(story.nodes), None)
+
+    dot_source, legend_entries, drawn = _build_dot_source(
+        story.uid,
+        story.revision,
+        show_gm,
+        story,
+        story.start_node_id,
+        q,
+        color_by,
+        shape_by,
+        focus_id,
+        radius if focus_id else 0,
+    )
+    if focus_id:
+        st.caption(
+            f"Large story ({len(story.nodes)} nodes): showing nodes within {radius} "
+            f"hops of **{story.nodes[focus_id].title}**. Enable 'Show full graph' "
+            "in the sidebar to draw everything."
+        )
+    # Big maps default to the force-directed fdp layout instead of dot's
+    # ranked one (the bundled viz.js has no sfdp)
+    engine = st.session_state.ui.get("layout_engine", "auto")
+    if engine == "auto":
+        engine = "dot" if drawn < LARGE_GRAPH_NODES else "fdp"
+    # Native Graphviz lays out far faster than viz.js; use it when installed
+    svg_markup = _render_svg_native(dot_source, engine)
+    # Only the viz.js fallback needs the DOT text inside the iframe
+    data_js = ""
+    if svg_markup is None:
+        data_js = (
+            f"const dot = {json.dumps(dot_source)};\n"  # safe escape as JS string
+            f"        const engine = {json.dumps(engine)};"
+        )
 
     def make_viz_html(container_id: str, height_css: str) -> str:
         # Minimal embedded Panzoom (Panzoom v9.4.0 UMD minified)
@@ -1190,36 +1769,47 @@ def tab_visualizer(story: Story):
         (function(global,factory){typeof exports==="object"&&typeof module!=="undefined"?module.exports=factory():typeof define==="function"&&define.amd?define(factory):(global=typeof globalThis!=="undefined"?globalThis:global||self,global.Panzoom=factory());})(this,(function(){function e(e,t){return Math.abs(e-t)<1e-7}return function(t,n){n=n||{};var o=t,a=o.parentElement,r=n.startX||0,i=n.startY||0,c=n.scale||1,l=!1,s=null,u=null,d=o.style,f=n.maxScale||5,g=n.minScale||.1;function m(e){return e.preventDefault(),!1}function p(e){if(!l)return;var t=e.clientX,i=e.clientY;s=r+t-u,u=i,l&&h(0,0,1)}function v(e){l=!1,document.removeEventListener("mousemove",p),document.removeEventListener("mouseup",v)}function h(e,t,n){var a=c*n;a>f&&(a=f),a<g&&(a=g);var l=a/c;r=r* l+ e*(1-l),i=i* l+ t*(1-l),c=a,d.transform="translate("+r+"px,"+i+"px) scale("+c+")"}o.addEventListener("mousedown",(function(e){l=!0,u=e.clientY,s=e.clientX-r,document.addEventListener("mousemove",p),document.addEventListener("mouseup",v)})),o.addEventListener("wheel",(function(t){t.preventDefault();var n=t.deltaY<0?1.1:.9,e=t.offsetX,o=t.offsetY;h(e-r,o-i,n)}),{passive:!1}),d.transformOrigin="0 0",d.willChange="transform";return{zoom:function(e){h(0,0,e)},zoomWithWheel:function(e){var t=e.deltaY<0?1.1:.9;h(e.offsetX-r,e.offsetY-i,t)},getScale:function(){return c}}};}));
         """
     
-        return f"""
-        <div id="{container_id}" style="width: 100%; height: {height_css}; border: 1px solid #444; background-color: white; overflow: hidden;">
-          <div style="width: 100%; height: 100%; display: flex; align-items: center; justify-content: center;">
-            <span style="color: #666; font-family: sans-serif;">Rendering graph…</span>
-          </div>
-        </div>
-    
+        if svg_markup is not None:
+            # Laid out server-side; just show it and attach pan/zoom
+            body = svg_markup
+            loader = ""
+            render_js = "Promise.resolve(container.querySelector('svg'))"
+        else:
+            body = (
+                '<div style="width: 100%; height: 100%; display: flex; '
+                'align-items: center; justify-content: center;">'
+                '<span style="color: #666; font-family: sans-serif;">Rendering graph…</span>'
+                "</div>"
+            )
+            loader = """
         <!-- Viz.js -->
         <script src="https://cdnjs.cloudflare.com/ajax/libs/viz.js/2.1.2/viz.js"></script>
         <script src="https://cdnjs.cloudflare.com/ajax/libs/viz.js/2.1.2/full.render.js"></script>
-    
+        """
+            render_js = "new Viz().renderSVGElement(dot, { engine: engine })"
+
+        return f"""
+        <div id="{container_id}" style="width: 100%; height: {height_css}; border: 1px solid #444; background-color: white; overflow: hidden;">{body}</div>
+        {loader}
         <!-- Embedded Panzoom -->
         <script>{panzoom_js}</script>
     
         <script>
-        const dot = {dot_js};
+        {data_js}
     
         (function() {{
             const container = document.getElementById("{container_id}");
             if (!container) return;
     
-            const viz = new Viz();
-    
-            viz.renderSVGElement(dot)
+            {render_js}
               .then(function(svg) {{
-                container.innerHTML = "";
+                if (!svg.parentNode) {{
+                    container.innerHTML = "";
+                    container.appendChild(svg);
+                }}
                 svg.style.width = "100%";
                 svg.style.height = "100%";
                 svg.style.display = "block";
-                container.appendChild(svg);
     
                 const panzoom = Panzoom(svg, {{
                     maxScale: 5,
@@ -1421,6 +2011,7 @@ def tab_play_mode(story: Story):
 
 
 # ------------- Tab: Playback -------------
+@story_fragment
 def tab_playback(story: Story):
     st.subheader("🎬 Playback — Rehearse a Path")
 
@@ -1429,24 +2020,27 @@ def tab_playback(story: Story):
         return
 
     # --- Choose starting node safely ---
-    ids = list(story.nodes.keys())
-    labels = [f"{story.nodes[i].title} · {i[:8]}" for i in ids]
+    items = tuple(story.nodes.items())
+    ids = [nid for nid, _ in items]
+    labels = {nid: f"{n.title} · {nid[:8]}" for nid, n in items}
 
-    if story.start_node_id in ids:
+    if story.start_node_id in labels:
         start_idx = ids.index(story.start_node_id)
     else:
         story.start_node_id = ids[0]
+        mark_changed(story)
         start_idx = 0
 
-    start_label = st.selectbox("Start at", labels, index=start_idx)
-    start_id = ids[labels.index(start_label)]
+    start_id = st.selectbox(
+        "Start at", ids, index=start_idx, format_func=lambda nid: labels[nid]
+    )
 
     colx, coly = st.columns(2)
     with colx:
         if st.button("🔁 Restart"):
             st.session_state.ui["playback_node_id"] = start_id
             st.session_state.ui["playback_history"] = [start_id]
-            st.rerun()
+            _rerun_fragment()
     with coly:
         if st.button("⬅️ Step Back"):
             hist = st.session_state.ui.get("playback_history", [])
@@ -1454,7 +2048,7 @@ def tab_playback(story: Story):
                 hist.pop()
                 st.session_state.ui["playback_history"] = hist
                 st.session_state.ui["playback_node_id"] = hist[-1]
-                st.rerun()
+                _rerun_fragment()
 
     # --- Initialize / validate current node ---
     curr = st.session_state.ui.get("playback_node_id")
@@ -1478,7 +2072,7 @@ def tab_playback(story: Story):
         if client is None:
             st.info(
                 "Add an OpenAI API key in `st.secrets['openai']['api_key']` to enable the DM Assist, "
-                "or use the 🧠 AI Assistant tab for offline tools."
+                "or use the 🧠 AI Assistant section for offline tools."
             )
         else:
             st.caption(
@@ -1592,6 +2186,7 @@ def tab_playback(story: Story):
                             gate="",
                         )
                     )
+                    mark_changed(story)
                     st.session_state.ui["selected_node_id"] = new_id
                     st.success(f"Created new node ({new_id[:8]}) and linked it as a choice.")
                     st.rerun()
@@ -1626,7 +2221,7 @@ def tab_playback(story: Story):
                 hist = st.session_state.ui.get("playback_history", [])
                 hist.append(ch.target_id)
                 st.session_state.ui["playback_history"] = hist
-                st.rerun()
+                _rerun_fragment()
 
     playback_hist = [
         (nid, story.nodes[nid].title)
@@ -1643,98 +2238,109 @@ def tab_playback(story: Story):
                 st.session_state.ui["playback_history"] = [
                     hid for hid, _ in playback_hist[: idx + 1]
                 ]
-                st.rerun()
+                _rerun_fragment()
         st.caption("Click any previous beat to jump back and branch from there.")
 
 
 
 # ------------- Tab: Generators -------------
+
+# Generator flavor tables; the selectbox options are derived from the keys
+NPC_NAMES = {
+    "Grizzled Guard": "Sergeant Thorne",
+    "Anxious Scholar": "Perrin of the Third Wing",
+    "Shifty Merchant": "Velka 'Two-Ledgers'",
+    "Doomsayer Priest": "Father Iksor",
+    "Eccentric Alchemist": "Mottle Fizzwhisk",
+}
+NPC_MOODS = ["mournful", "wary", "neutral", "jovial", "zealous"]
+NPC_QUIRKS = [
+    "collects cursed spoons",
+    "forgets nouns",
+    "speaks to shadows",
+    "overly polite",
+    "won't touch coins",
+]
+SCENE_BASE = {
+    "Tavern": "The hearth crackles like a creature clearing its throat.",
+    "Forest": "The trees lean in, like gossiping aunties with mossy hands.",
+    "Ruins": "Stone arches remember names no mouth can pronounce.",
+    "Cave": "Drips count seconds in a calendar no one respects.",
+    "City Night": "Lanterns blink like tired gods on break.",
+}
+SCENE_SPICE = {
+    "Cosmic Absurd": "Somewhere, a star laughs at its own joke.",
+    "Low Humor": "A stool wobbles with misplaced dignity.",
+    "Dread": "Every shadow waits like a held breath.",
+    "Heroic": "Even the dust looks ready to rise to the call.",
+    "Whimsical": "Cats conduct moonlight with their tails.",
+}
+
 def tab_generators(story: Story):
     st.subheader("🧪 Generators — NPCs & Snippets (rule-based)")
 
+    # Each generator is its own fragment, so its buttons only rerun itself
     col1, col2 = st.columns(2)
-
     with col1:
-        st.markdown("#### NPC Sketch Generator")
-        arche = st.selectbox(
-            "Archetype",
-            [
-                "Grizzled Guard",
-                "Anxious Scholar",
-                "Shifty Merchant",
-                "Doomsayer Priest",
-                "Eccentric Alchemist",
-            ],
-        )
-        mood = st.select_slider(
-            "Mood",
-            options=["mournful", "wary", "neutral", "jovial", "zealous"],
-        )
-        quirk = st.selectbox(
-            "Quirk",
-            [
-                "collects cursed spoons",
-                "forgets nouns",
-                "speaks to shadows",
-                "overly polite",
-                "won't touch coins",
-            ],
-        )
-        btn = st.button("✨ Generate NPC")
-        if btn:
-            name = {
-                "Grizzled Guard": "Sergeant Thorne",
-                "Anxious Scholar": "Perrin of the Third Wing",
-                "Shifty Merchant": "Velka 'Two-Ledgers'",
-                "Doomsayer Priest": "Father Iksor",
-                "Eccentric Alchemist": "Mottle Fizzwhisk",
-            }[arche]
-            snippet = f"{name}, a {arche.lower()}, looks {mood}. They {quirk}."
-            st.write(snippet)
-            if st.button("➕ Add as Node"):
-                nid = add_node(
-                    story,
-                    title=name,
-                    text=f"{snippet}\n\n'…'",
-                    npc=name,
-                    emotion=mood,
-                )
-                st.success(f"Added node: {name} ({nid[:8]})")
-
+        _npc_generator(story)
     with col2:
-        st.markdown("#### Scene Flavor Generator")
-        setting = st.selectbox(
-            "Setting", ["Tavern", "Forest", "Ruins", "Cave", "City Night"]
-        )
-        tone = st.selectbox(
-            "Tone", ["Cosmic Absurd", "Low Humor", "Dread", "Heroic", "Whimsical"]
-        )
-        if st.button("✨ Generate Scene"):
-            base = {
-                "Tavern": "The hearth crackles like a creature clearing its throat.",
-                "Forest": "The trees lean in, like gossiping aunties with mossy hands.",
-                "Ruins": "Stone arches remember names no mouth can pronounce.",
-                "Cave": "Drips count seconds in a calendar no one respects.",
-                "City Night": "Lanterns blink like tired gods on break.",
-            }[setting]
-            spice = {
-                "Cosmic Absurd": "Somewhere, a star laughs at its own joke.",
-                "Low Humor": "A stool wobbles with misplaced dignity.",
-                "Dread": "Every shadow waits like a held breath.",
-                "Heroic": "Even the dust looks ready to rise to the call.",
-                "Whimsical": "Cats conduct moonlight with their tails.",
-            }[tone]
-            text = f"{base} {spice}"
-            st.write(text)
-            if st.button("➕ Add as Node", key="add_scene"):
-                nid = add_node(
-                    story,
-                    title=f"{setting} Scene",
-                    text=text,
-                    location=setting,
-                    emotion=tone,
-                )
-                st.success(f"Added node: {setting} Scene ({nid[:8]})")
+        _scene_generator(story)
+
+
+@story_fragment
+def _npc_generator(story: Story):
+    st.markdown("#### NPC Sketch Generator")
+    arche = st.selectbox("Archetype", list(NPC_NAMES))
+    mood = st.select_slider("Mood", options=NPC_MOODS)
+    quirk = st.selectbox("Quirk", NPC_QUIRKS)
+    # Buttons are only True on the run they were clicked in, so the result
+    # is kept in session state for the "Add as Node" click to find
+    if st.button("✨ Generate NPC"):
+        name = NPC_NAMES[arche]
+        st.session_state.pending_npc = {
+            "name": name,
+            "snippet": f"{name}, a {arche.lower()}, looks {mood}. They {quirk}.",
+            "mood": mood,
+        }
+    pending = st.session_state.get("pending_npc")
+    if pending:
+        st.write(pending["snippet"])
+        if st.button("➕ Add as Node", key="add_npc"):
+            nid = add_node(
+                story,
+                title=pending["name"],
+                text=f"{pending['snippet']}\n\n'…'",
+                npc=pending["name"],
+                emotion=pending["mood"],
+            )
+            del st.session_state.pending_npc
+            st.success(f"Added node: {pending['name']} ({nid[:8]})")
+
+
+@story_fragment
+def _scene_generator(story: Story):
+    st.markdown("#### Scene Flavor Generator")
+    setting = st.selectbox("Setting", list(SCENE_BASE))
+    tone = st.selectbox("Tone", list(SCENE_SPICE))
+    if st.button("✨ Generate Scene"):
+        st.session_state.pending_scene = {
+            "text": f"{SCENE_BASE[setting]} {SCENE_SPICE[tone]}",
+            "setting": setting,
+            "tone": tone,
+        }
+    pending = st.session_state.get("pending_scene")
+    if pending:
+        st.write(pending["text"])
+        if st.button("➕ Add as Node", key="add_scene"):
+            nid = add_node(
+                story,
+                title=f"{pending['setting']} Scene",
+                text=pending["text"],
+                location=pending["setting"],
+                emotion=pending["tone"],
+            )
+            del st.session_state.pending_scene
+            st.success(f"Added node: {pending['setting']} Scene ({nid[:8]})")
 
 def tab_ai(story: Story):
     st.subheader("🧠 AI Story Assistant (BranchWeaver)")
@@ -1956,10 +2562,10 @@ def tab_ai(story: Story):
                     nd = json.loads(st.session_state["ai_last_expand_json"])
                     sel_node.title = nd.get("title", sel_node.title)
                     sel_node.text = nd.get("text", sel_node.text)
-                    sel_node.npc = nd.get("npc", sel_node.npc)
-                    sel_node.location = nd.get("location", sel_node.location)
-                    sel_node.emotion = nd.get("emotion", sel_node.emotion)
-                    sel_node.tags = nd.get("tags", sel_node.tags)
+                    sel_node.npc = _intern(nd.get("npc", sel_node.npc))
+                    sel_node.location = _intern(nd.get("location", sel_node.location))
+                    sel_node.emotion = _intern(nd.get("emotion", sel_node.emotion))
+                    sel_node.tags = [_intern(t) for t in nd.get("tags", sel_node.tags) or ()]
                     sel_node.gm_notes = nd.get("gm_notes", sel_node.gm_notes)
                     sel_node.choices = []
                     for ch_def in nd.get("choices", []) or []:
@@ -1967,10 +2573,13 @@ def tab_ai(story: Story):
                             Choice(
                                 text=ch_def.get("text", ""),
                                 target_id="",  # DM can wire later in editor
-                                tags=ch_def.get("tags", []) or [],
+                                tags=[_intern(t) for t in ch_def.get("tags") or ()],
                                 gate=ch_def.get("gate", ""),
                             )
                         )
+                    touch_node(sel_node)
+                    note_edited(story, sel_node.id)
+                    mark_changed(story)
                     st.success("Node updated with AI expansion.")
                     st.session_state.pop("ai_last_expand_json", None)
                 except Exception as e:
@@ -2037,6 +2646,9 @@ def tab_ai(story: Story):
                     sel_node.text = nd.get("text", sel_node.text)
                     if "gm_notes" in nd:
                         sel_node.gm_notes = nd.get("gm_notes", sel_node.gm_notes)
+                    touch_node(sel_node)
+                    note_edited(story, sel_node.id)
+                    mark_changed(story)
                     st.success("Node text updated.")
                     st.session_state.pop("ai_last_rewrite_json", None)
                 except Exception as e:
@@ -2045,39 +2657,41 @@ def tab_ai(story: Story):
 
 
 # ------------- Tab: World State -------------
+@story_fragment
 def tab_world_state(story: Story):
     st.subheader("🌍 World State — Tags, NPCs, Locations")
-    npcs = sorted({n.npc for n in story.nodes.values() if n.npc})
-    locs = sorted({n.location for n in story.nodes.values() if n.location})
-    tags = sorted({t for n in story.nodes.values() for t in n.tags})
+    npcs, locs, tags = _world_summaries(story.uid, story.revision, story)
 
     c1, c2, c3 = st.columns(3)
     with c1:
         st.markdown("#### NPCs")
-        for x in npcs:
-            st.write("• ", x)
+        if npcs:
+            st.markdown("\n".join(f"- {x}" for x in npcs))
     with c2:
         st.markdown("#### Locations")
-        for x in locs:
-            st.write("• ", x)
+        if locs:
+            st.markdown("\n".join(f"- {x}" for x in locs))
     with c3:
         st.markdown("#### Tags")
-        for x in tags:
-            st.write("• ", x)
+        if tags:
+            st.markdown("\n".join(f"- {x}" for x in tags))
 
     st.markdown("---")
     st.markdown("#### Quick Create")
-    title = st.text_input("Title", key="ws_title")
-    text = st.text_area("Text", key="ws_text", height=100)
-    colx, coly, colz = st.columns(3)
-    with colx:
-        npc = st.text_input("NPC", key="ws_npc")
-    with coly:
-        loc = st.text_input("Location", key="ws_loc")
-    with colz:
-        emo = st.text_input("Emotion", key="ws_emo")
-    ttags = st.text_input("Tags (comma-separated)", key="ws_tags")
-    if st.button("➕ Add Node", key="ws_add"):
+    # A form sends one rerun on submit instead of one per edited field
+    with st.form("ws_quick_create", clear_on_submit=True):
+        title = st.text_input("Title", key="ws_title")
+        text = st.text_area("Text", key="ws_text", height=100)
+        colx, coly, colz = st.columns(3)
+        with colx:
+            npc = st.text_input("NPC", key="ws_npc")
+        with coly:
+            loc = st.text_input("Location", key="ws_loc")
+        with colz:
+            emo = st.text_input("Emotion", key="ws_emo")
+        ttags = st.text_input("Tags (comma-separated)", key="ws_tags")
+        submitted = st.form_submit_button("➕ Add Node")
+    if submitted:
         nid = add_node(
             story,
             title=title or "Untitled",
@@ -2085,18 +2699,39 @@ def tab_world_state(story: Story):
             npc=npc,
             location=loc,
             emotion=emo,
-            tags=[t.strip() for t in ttags.split(",") if t.strip()],
+            tags=parse_tags(ttags),
         )
         st.success(f"Added node {nid[:8]}")
 
 
+def _import_uploaded_story() -> None:
+    """file_uploader callback: load the uploaded JSON as the current story."""
+    up = st.session_state.get("import_json")
+    if up is None:
+        # Upload cleared with the X; nothing to import
+        return
+    try:
+        story = story_from_json(up.getvalue())
+    except Exception as e:
+        st.session_state._import_msg = ("error", f"Failed to import: {e}")
+        return
+    st.session_state.story = story
+
+    # Reset UI selection / playback to new story
+    first_id = next(iter(story.nodes.keys()), None)
+    st.session_state.ui["selected_node_id"] = first_id
+    st.session_state.ui["playback_node_id"] = first_id
+    st.session_state.ui["playback_history"] = [first_id] if first_id else []
+    st.session_state._import_msg = ("success", "Imported story.")
+
+
 # ------------- Tab: Import/Export -------------
 def tab_io(story: Story):
     st.subheader("📦 Import / Export")
     col1, col2 = st.columns(2)
     with col1:
         st.markdown("#### Export JSON")
-        json_bytes = story_to_json_bytes(story)
+        json_bytes = _export_json_cached(story.uid, story.revision, story)
         st.download_button(
             "⬇️ Download story.json",
             data=json_bytes,
@@ -2107,45 +2742,37 @@ def tab_io(story: Story):
 
 
         st.markdown("#### Export Markdown")
-        md_simple = export_markdown(story, detailed=False)
+        # Passing callables defers the export until the button is clicked
         st.download_button(
-            "⬇️ Summary.md", data=md_simple, file_name="story_summary.md"
+            "⬇️ Summary.md",
+            data=partial(_export_markdown_cached, story.uid, story.revision, story, False),
+            file_name="story_summary.md",
+            mime="text/markdown",
         )
-        md_d = export_markdown(story, detailed=True)
         st.download_button(
-            "⬇️ Detailed.md", data=md_d, file_name="story_detailed.md"
+            "⬇️ Detailed.md",
+            data=partial(_export_markdown_cached, story.uid, story.revision, story, True),
+            file_name="story_detailed.md",
+            mime="text/markdown",
         )
 
     with col2:
         st.markdown("#### Import JSON")
-        up = st.file_uploader("Upload BranchWeaver JSON", type=["json"], key="import_json")
-    
-        if up is not None and not st.session_state.has_imported:
-            try:
-                data = up.read().decode("utf-8")
-                st.session_state.story = story_from_json(data)
-    
-                # Reset UI selection / playback to new story
-                story = st.session_state.story
-                first_id = next(iter(story.nodes.keys()), None)
-                st.session_state.ui["selected_node_id"] = first_id
-                st.session_state.ui["playback_node_id"] = first_id
-                st.session_state.ui["playback_history"] = [first_id] if first_id else []
-    
-                st.session_state.has_imported = True   # prevent repeat imports
-    
-                st.success("Imported story.")
-                st.rerun()
-    
-            except Exception as e:
-                st.error(f"Failed to import: {e}")
-    
-        # If user clears the file uploader (clicks X), allow importing again
-        if up is None and st.session_state.has_imported:
-            st.session_state.has_imported = False
-
-
-
+        # Importing in on_change runs before the script, so this whole run
+        # already sees the new story and no extra st.rerun() is needed
+        st.file_uploader(
+            "Upload BranchWeaver JSON",
+            type=["json"],
+            key="import_json",
+            on_change=_import_uploaded_story,
+        )
+        msg = st.session_state.pop("_import_msg", None)
+        if msg is not None:
+            kind, text = msg
+            if kind == "error":
+                st.error(text)
+            else:
+                st.success(text)
 
 
 # ------------- Tab: Settings -------------
@@ -2154,14 +2781,8 @@ def tab_settings(story: Story):
     st.caption("Display and defaults.")
     st.session_state.ui["tone_preset"] = st.selectbox(
         "Default Tone Preset",
-        ["Cosmic Absurd", "Dread", "Heroic", "Whimsical", "Neutral"],
-        index=[
-            "Cosmic Absurd",
-            "Dread",
-            "Heroic",
-            "Whimsical",
-            "Neutral",
-        ].index(st.session_state.ui["tone_preset"]),
+        TONE_PRESETS,
+        index=TONE_INDEX.get(st.session_state.ui["tone_preset"], 0),
     )
     st.write("Color Palette (fixed)")
     st.color_picker("Example Color", COLORS[0], key="dummy_color_picker")
@@ -2175,52 +2796,39 @@ def tab_settings(story: Story):
 # Main App
 # -------------------------------
 def main():
-    ensure_state()
-
-    # One-time autosave load attempt
-    if "autosave_checked" not in st.session_state:
+    # Session defaults and the autosave restore only need to run once per
+    # session; later reruns skip straight past them on a single key lookup
+    if not st.session_state.get("_bw_init"):
+        ensure_state()
         try_autoload()
-        st.session_state.autosave_checked = True
+        st.session_state._bw_init = True
 
     story: Story = st.session_state.story
 
     sidebar_project(story)
 
-    tabs = st.tabs([
-        "📘 Overview",
-        "🧩 Branch Editor",
-        "🕸️ Visualizer",
-        "▶️ Play Mode",
-        "🎬 Playback",
-        "🧪 Generators",
-        "🧠 AI Assistant",
-        "🌍 World State",
-        "📦 Import / Export",
-        "⚙️ Settings",
-    ])
-
-
-    with tabs[0]:
-        tab_overview(story)
-    with tabs[1]:
-        tab_editor(story)
-    with tabs[2]:
-        tab_visualizer(story)
-    with tabs[3]:
-        tab_play_mode(story)
-    with tabs[4]:
-        tab_playback(story)
-    with tabs[5]:
-        tab_generators(story)
-    with tabs[6]:
-        tab_ai(story)          # 👈 NEW
-    with tabs[7]:
-        tab_world_state(story)
-    with tabs[8]:
-        tab_io(story)
-    with tabs[9]:
-        tab_settings(story)
-
+    # st.tabs would execute every tab body on each rerun; a radio lets us
+    # run only the section the user is looking at
+    active = st.radio(
+        "Section",
+        SECTIONS,
+        horizontal=True,
+        label_visibility="collapsed",
+        key="active_tab",
+    )
+    renderers = dict(zip(SECTIONS, (
+        tab_overview,
+        tab_editor,
+        tab_visualizer,
+        tab_play_mode,
+        tab_playback,
+        tab_generators,
+        tab_ai,
+        tab_world_state,
+        tab_io,
+        tab_settings,
+    )))
+    renderers[active](story)
 
     # Auto-save story on each run
     autosave(story)